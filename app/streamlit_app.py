@@ -6,15 +6,30 @@ Run:
 """
 from __future__ import annotations
 
+import functools
+import hashlib
 import json
+import operator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
 from math import inf
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 
-from eligibility import screen_patient_for_trial
-from llm.gemini_agent import explain_eligibility_with_gemini
+try:
+    import orjson  # ~3x faster than stdlib json on these payloads
+except ImportError:  # pragma: no cover
+    orjson = None
+
+from eligibility import (
+    PatientCohort,
+    ScreenResult,
+    screen_cohort_for_trial,
+    screen_patient_for_trial,
+)
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = BASE_DIR / "data"
@@ -27,15 +42,306 @@ st.set_page_config(page_title="Clinical Trial Eligibility (T2D)", layout="wide")
 
 
 @st.cache_data
-def load_json(path: Path):
-    return json.loads(path.read_text(encoding="utf-8"))
+def load_json(path: Path, mtime: float = 0.0):
+    """Parse a JSON data file; `mtime` keys the cache so edits invalidate it."""
+    raw = path.read_bytes()
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+@st.cache_data
+def load_patients_df(path: Path, mtime: float = 0.0) -> pd.DataFrame:
+    """
+    Columnar patient load for the vectorized screener.
+
+    Converts patients.json to Parquet on first use; while the Parquet file is
+    newer than the JSON, later loads skip JSON parsing entirely and read the
+    Arrow-backed columns directly.
+    """
+    pq_path = path.with_suffix(".parquet")
+    if pq_path.exists() and pq_path.stat().st_mtime >= mtime:
+        try:
+            return pd.read_parquet(pq_path)
+        except Exception:
+            pass  # corrupt/stale file; fall through and rebuild it
+    df = pd.DataFrame(load_json(path, mtime))
+    try:
+        df.to_parquet(pq_path)
+    except Exception:
+        pass  # pyarrow unavailable; JSON path still works
+    return df
+
+
+@st.cache_data
+def build_notes_by_pid(notes: list[dict]) -> dict:
+    """One-time patient_id -> note index; O(1) lookup on every rerun."""
+    return {n.get("patient_id"): n.get("note", "") for n in notes}
+
+
+@st.cache_data
+def build_patients_by_pid(patients: list[dict]) -> dict:
+    """One-time patient_id -> patient index, replacing per-rerun linear scans."""
+    return {p.get("patient_id"): p for p in patients}
+
+
+def _stable_json(obj) -> str:
+    """Canonical (sorted-key) serialization used for cache keys."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode("utf-8")
+    return json.dumps(obj, sort_keys=True)
+
+
+@st.cache_resource(show_spinner=False)
+def gemini_client():
+    """One process-wide Gemini client shared by every session and rerun."""
+    from llm.gemini_agent import _make_client
+
+    return _make_client()
+
+
+@st.cache_resource
+def compiled_trials(trials: list[dict]) -> dict:
+    """
+    Compile every trial's rule plan once per process (trial_id -> plan).
+
+    Goes through the engine's memoized compile, so later
+    screen_patient_for_trial calls hit the same warm cache instead of paying
+    compilation on the first interaction.
+    """
+    from eligibility import _compile_trial_cached
+
+    return {t.get("trial_id"): _compile_trial_cached(t) for t in trials}
+
+
+# Part of the explanation cache key: bump whenever the prompt changes
+# (SYSTEM_INSTRUCTIONS, payload shape, schema) so stale persisted entries
+# are not served against a different prompt.
+EXPLANATION_PROMPT_VERSION = "v1"
+
+
+@st.cache_data(show_spinner=False, ttl=86400, max_entries=512, persist="disk")
+def _cached_gemini_explanation(
+    patient_json: str,
+    note: str,
+    trial_json: str,
+    rb_json: str,
+    force_llm: bool = False,
+    prompt_version: str = EXPLANATION_PROMPT_VERSION,
+    _on_partial=None,
+) -> dict:
+    """
+    Memoized Gemini explanation, persisted to disk for a day.
+
+    Takes pre-serialized (sorted-key) JSON strings so Streamlit's hasher is a
+    cheap O(len) pass; identical (patient, trial, rule result) inputs never
+    trigger a second network call, even across sessions. `max_entries` bounds
+    the cache so it cannot grow without limit, and `prompt_version` keys the
+    entries to the current prompt wording.
+
+    `_on_partial` (underscore = excluded from the cache key) is called with
+    each partial dict while a response streams in; on a cache hit the stored
+    result returns immediately and the callback is never invoked.
+
+    Call through `cached_gemini_explanation`, which evicts degraded
+    parse-failure results so they are shown once but never replayed.
+    """
+    # Deferred so first page render doesn't pay the Gemini SDK import;
+    # Python caches the module, so later clicks are free.
+    from llm.gemini_agent import explain_eligibility, explain_eligibility_stream
+
+    patient = json.loads(patient_json)
+    trial = json.loads(trial_json)
+    rb = ScreenResult(**json.loads(rb_json))
+
+    if _on_partial is not None and (force_llm or rb.status == "Uncertain"):
+        out: dict = {}
+        for partial in explain_eligibility_stream(
+            patient, note, trial, rb, client=gemini_client()
+        ):
+            out = partial
+            _on_partial(partial)
+        return out
+
+    return explain_eligibility(
+        patient=patient,
+        clinical_note=note,
+        trial=trial,
+        rule_based=rb,
+        force_llm=force_llm,
+        client=gemini_client() if force_llm or rb.status == "Uncertain" else None,
+    )
+
+
+def cached_gemini_explanation(
+    patient_json: str,
+    note: str,
+    trial_json: str,
+    rb_json: str,
+    force_llm: bool = False,
+    _on_partial=None,
+) -> dict:
+    """
+    Cached explanation lookup that never caches a degraded answer.
+
+    Exceptions already bypass the cache; the parse-failure fallback dict
+    (marked by `_raw_model_text`) would otherwise be persisted for a day and
+    replayed on every later click instead of retrying the model. Surface it
+    once, then drop its cache entry so the next request calls Gemini again.
+    """
+    out = _cached_gemini_explanation(
+        patient_json, note, trial_json, rb_json, force_llm, _on_partial=_on_partial
+    )
+    if "_raw_model_text" in out:
+        _cached_gemini_explanation.clear(patient_json, note, trial_json, rb_json, force_llm)
+    return out
+
+
+def gemini_explanation_section(patient: dict, note: str, trial: dict, res: ScreenResult, key: str) -> None:
+    """
+    Explanation block shared by both view modes.
+
+    Decisive rule results ("Eligible"/"Not eligible") are restated locally by
+    `explain_eligibility` at no token cost and shown immediately; the LLM is
+    only consulted for "Uncertain" results or when the user explicitly asks
+    for a regenerated narrative.
+    """
+    decisive = res.status != "Uncertain"
+    if decisive:
+        out = cached_gemini_explanation(
+            _stable_json(patient), note, _stable_json(trial), _stable_json(asdict(res))
+        )
+        st.json(out, expanded=False)
+        label = "Regenerate with LLM narrative"
+    else:
+        label = "Explain with Gemini (LLM)"
+    if st.button(label, type="primary", key=key):
+        # Streamed: partial explanations render into the placeholder as the
+        # model generates; cache hits skip straight to the final dict.
+        placeholder = st.empty()
+        out = cached_gemini_explanation(
+            _stable_json(patient), note, _stable_json(trial), _stable_json(asdict(res)),
+            force_llm=True,
+            _on_partial=lambda partial: placeholder.json(partial, expanded=True),
+        )
+        placeholder.empty()
+        st.success("Done")
+        st.json(out, expanded=True)
+
+
+# Bump to invalidate persisted screening caches after rule-engine changes.
+RULES_VERSION = 2
 
 
-def get_note(notes_by_pid: dict, pid: str) -> str:
-    return notes_by_pid.get(pid, "")
+def _screen_cache_path(patients: list[dict], trials: list[dict]) -> Path:
+    digest = hashlib.blake2b(
+        _stable_json([RULES_VERSION, patients, trials]).encode("utf-8")
+    ).hexdigest()[:16]
+    return DATA_DIR / f"screen_cache_{digest}.json"
+
+
+def _age_out_of_range_result(age, lo, hi) -> ScreenResult:
+    """Synthesize the decisive Not-eligible result for an age hard-filter miss."""
+    msg = f"Age {age} < {lo}" if lo is not None and age < lo else f"Age {age} > {hi}"
+    return ScreenResult(
+        status="Not eligible",
+        reasons=["One or more criteria failed: " + msg],
+        missing_fields=[],
+        criteria_passed=[],
+        criteria_failed=[msg],
+    )
+
+
+@st.cache_resource
+def build_screen_matrix(patients: list[dict], trials: list[dict]) -> dict:
+    """
+    Precompute the full (patient_id, trial_id) -> ScreenResult matrix once.
+
+    Patients/trials JSON are static between edits, so instead of re-screening
+    on every Streamlit rerun, both view modes index into this matrix. The
+    matrix is also persisted to disk keyed by a hash of (RULES_VERSION,
+    patients, trials); delete the file or bump RULES_VERSION to invalidate.
+
+    Patients whose age is hard-out of a trial's inclusion range are triaged
+    with one vectorized comparison and never reach the full rule engine;
+    their entries carry just the decisive age failure.
+    """
+    cache_path = _screen_cache_path(patients, trials)
+    if cache_path.exists():
+        raw = json.loads(cache_path.read_text(encoding="utf-8"))
+        return {tuple(k.split("|", 1)): ScreenResult(**v) for k, v in raw.items()}
+
+    ages = patients_soa(patients)["age_years"]
+
+    def screen_one_trial(trial: dict) -> list[tuple]:
+        tid = trial.get("trial_id")
+        inc_age = trial.get("inclusion", {}).get("age_years", {})
+        lo, hi = inc_age.get("min"), inc_age.get("max")
+        with np.errstate(invalid="ignore"):
+            age_out = np.zeros(len(patients), dtype=bool)
+            if lo is not None:
+                age_out |= ages < lo
+            if hi is not None:
+                age_out |= ages > hi
+        return [
+            (
+                (p.get("patient_id"), tid),
+                _age_out_of_range_result(p["age_years"], lo, hi)
+                if age_out[i]
+                else screen_patient_for_trial(p, trial),
+            )
+            for i, p in enumerate(patients)
+        ]
+
+    # Fan the per-trial screening out over a thread pool. The rule engine is
+    # cheap, but this keeps the build scalable as the trial catalog grows and
+    # gives the (network-bound) LLM batch path the same shape to plug into.
+    with ThreadPoolExecutor(max_workers=min(16, len(trials)) or 1) as ex:
+        matrix = {k: v for batch in ex.map(screen_one_trial, trials) for k, v in batch}
+    blob = {f"{pid}|{tid}": asdict(res) for (pid, tid), res in matrix.items()}
+    if orjson is not None:
+        cache_path.write_bytes(orjson.dumps(blob))
+    else:
+        cache_path.write_text(json.dumps(blob), encoding="utf-8")
+    return matrix
+
+
+# ---------- Vectorized cohort screening (overview table) ----------
+def screen_cohort_overview(patients: list[dict], trial: dict, pdf: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Trial -> Patients overview table, built on the vectorized cohort screener.
+
+    Delegates the rule evaluation to `eligibility.screen_cohort_for_trial`
+    (one columnar comparison per criterion, identical output to the scalar
+    engine) and assembles the display columns around it. The per-patient
+    drilldown still uses the full ScreenResult from the screening matrix.
+    """
+    if pdf is None:
+        pdf = pd.DataFrame(patients)
+    res = screen_cohort_for_trial(pdf, trial, patients, cohort=build_cohort(patients))
+
+    def patient_col(name: str):
+        return pdf[name] if name in pdf.columns else pd.Series([None] * len(pdf))
+
+    return pd.DataFrame(
+        {
+            "patient_id": patient_col("patient_id"),
+            "age": patient_col("age_years"),
+            "sex": patient_col("sex"),
+            "hba1c": patient_col("hba1c_percent"),
+            "bmi": patient_col("bmi"),
+            "egfr": patient_col("egfr"),
+            "status": res["status"],
+            "why_rule_based": [" | ".join(r) for r in res["reasons"]],
+        }
+    )
 
 
 # ---------- Ranking helpers ----------
+# Numeric features used by the closeness ranking, in column order.
+_CLOSENESS_FIELDS = ["age_years", "hba1c_percent", "bmi", "egfr", "uacr_mg_g"]
+
+
 def _range_distance(value, lo=None, hi=None) -> float:
     """0 if within range; positive distance to nearest boundary if outside; inf if missing."""
     if value is None:
@@ -48,50 +354,107 @@ def _range_distance(value, lo=None, hi=None) -> float:
 
 
 def _trial_closeness(patient: dict, trial: dict) -> float:
-    """Lower is better. Uses numeric inclusion ranges from the trial JSON."""
+    """Lower is better. Uses numeric inclusion ranges from the trial JSON.
+
+    Short-circuits to inf on the first missing dimension: once any term is
+    inf the total is inf regardless of the remaining ranges.
+    """
     inc = trial.get("inclusion", {})
     dist = 0.0
 
-    if "age_years" in inc:
-        dist += _range_distance(
-            patient.get("age_years"),
-            inc["age_years"].get("min"),
-            inc["age_years"].get("max"),
-        )
-
-    if "hba1c_percent" in inc:
-        dist += _range_distance(
-            patient.get("hba1c_percent"),
-            inc["hba1c_percent"].get("min"),
-            inc["hba1c_percent"].get("max"),
-        )
-
-    if "bmi" in inc:
-        dist += _range_distance(
-            patient.get("bmi"),
-            inc["bmi"].get("min"),
-            inc["bmi"].get("max"),
-        )
-
-    if "egfr" in inc:
-        dist += _range_distance(
-            patient.get("egfr"),
-            inc["egfr"].get("min"),
-            inc["egfr"].get("max"),
-        )
-
-    if "uacr_mg_g" in inc:
-        dist += _range_distance(
-            patient.get("uacr_mg_g"),
-            inc["uacr_mg_g"].get("min"),
-            None,
+    for field in _CLOSENESS_FIELDS:
+        if field not in inc:
+            continue
+        d = _range_distance(
+            patient.get(field),
+            inc[field].get("min"),
+            # uacr_mg_g ranks on its minimum only.
+            None if field == "uacr_mg_g" else inc[field].get("max"),
         )
+        if d == inf:
+            return inf
+        dist += d
 
     return dist
 
 
+@st.cache_resource
+def build_cohort(patients: list[dict]) -> PatientCohort:
+    """Columnar view of the cohort, built once per data load."""
+    return PatientCohort.from_records(patients)
+
+
+@st.cache_resource
+def patients_soa(patients: list[dict]) -> dict:
+    """
+    Struct-of-arrays view of the cohort: one contiguous float array per
+    numeric feature (NaN = missing), built once per data load.
+
+    Scanning a single feature across all patients then walks one array
+    instead of chasing a Python dict per patient; the closeness matrix and
+    the age triage both read these columns directly. The arrays come from
+    the shared `PatientCohort` layout in `eligibility`.
+    """
+    cohort = build_cohort(patients)
+    soa = {"patient_id": cohort.patient_ids}
+    for f in _CLOSENESS_FIELDS:
+        soa[f] = cohort.numeric[f]
+    return soa
+
+
+@st.cache_resource
+def build_closeness_matrix(patients: list[dict], trials: list[dict]):
+    """
+    Precompute `_trial_closeness` for every (patient, trial) pair in one
+    broadcast NumPy expression instead of N*M scalar calls.
+
+    Patient features go into a contiguous [N, 5] float array (NaN = missing)
+    and trial bounds into [M, 5] lo/hi arrays (+-inf = no bound); the whole
+    matrix is then max(0, lo-v) + max(0, v-hi) summed over features, with inf
+    wherever a criterion exists but the patient value is missing — exactly the
+    scalar semantics. Returns (matrix, pid -> row, tid -> col).
+    """
+    n, m = len(patients), len(trials)
+    k = len(_CLOSENESS_FIELDS)
+
+    soa = patients_soa(patients)
+    pat = np.column_stack([soa[f] for f in _CLOSENESS_FIELDS])
+
+    lo = np.full((m, k), -np.inf)
+    hi = np.full((m, k), np.inf)
+    crit = np.zeros((m, k), dtype=bool)
+    for j, t in enumerate(trials):
+        inc = t.get("inclusion", {})
+        for c, f in enumerate(_CLOSENESS_FIELDS):
+            if f in inc:
+                crit[j, c] = True
+                if inc[f].get("min") is not None:
+                    lo[j, c] = inc[f]["min"]
+                # uacr_mg_g ranks on its minimum only, matching _trial_closeness.
+                if f != "uacr_mg_g" and inc[f].get("max") is not None:
+                    hi[j, c] = inc[f]["max"]
+
+    pat_missing = np.isnan(pat)[:, None, :]  # [N, 1, K]
+    v = np.where(pat_missing[:, 0, :], 0.0, pat)[:, None, :]
+    dist = np.maximum(0.0, lo[None] - v) + np.maximum(0.0, v - hi[None])
+    dist = np.where(crit[None] & ~pat_missing, dist, 0.0)
+
+    # A missing value on any required dimension makes the whole pair inf, so
+    # keep the sum clean and overwrite those pairs in one masked assignment.
+    has_missing = (pat_missing & crit[None]).any(axis=2)
+    mat = np.where(has_missing, np.inf, dist.sum(axis=2))
+    pid_rows = {p.get("patient_id"): i for i, p in enumerate(patients)}
+    tid_cols = {t.get("trial_id"): j for j, t in enumerate(trials)}
+    return mat, pid_rows, tid_cols
+
+
+@functools.lru_cache(maxsize=32)
 def _phase_rank(phase: str) -> int:
-    """Lower is better. Prefers Phase 3 over Phase 2 over Phase 1."""
+    """Lower is better. Prefers Phase 3 over Phase 2 over Phase 1.
+
+    Phases come from a tiny vocabulary, so the normalize-and-scan work is
+    memoized per distinct string.
+    """
     p = (phase or "").strip().lower()
     if "phase 3" in p:
         return 0
@@ -102,40 +465,57 @@ def _phase_rank(phase: str) -> int:
     return 9
 
 
-def rank_key(patient: dict, trial: dict, res) -> tuple:
-    """Lower tuple is better."""
-    status_priority = {"Eligible": 0, "Uncertain": 1, "Not eligible": 2}
-    return (
-        status_priority.get(res.status, 99),
-        len(res.criteria_failed or []),      # fewer failures better
-        len(res.missing_fields or []),       # fewer missing fields better
-        _trial_closeness(patient, trial),    # closer to inclusion ranges better
-        _phase_rank(trial.get("phase", "")), # optional
-        -len(res.criteria_passed or []),     # more passes better
-    )
+_STATUS_PRIORITY = {"Eligible": 0, "Uncertain": 1, "Not eligible": 2}
 
 
 @st.cache_data
-def screen_and_rank_trials_for_patient(patient: dict, trials: list[dict]) -> list[dict]:
+def screen_and_rank_trials_for_patient(
+    patient: dict,
+    trials: list[dict],
+    _matrix: dict | None = None,
+    _closeness: tuple | None = None,
+) -> list[dict]:
     ranked = []
+    pid = patient.get("patient_id")
     for t in trials:
-        res = screen_patient_for_trial(patient, t)
+        if _matrix is not None:
+            res = _matrix[(pid, t.get("trial_id"))]
+        else:
+            res = screen_patient_for_trial(patient, t)
+        if _closeness is not None:
+            mat, pid_rows, tid_cols = _closeness
+            closeness = float(mat[pid_rows[pid], tid_cols[t.get("trial_id")]])
+        else:
+            closeness = _trial_closeness(patient, t)
+        n_failed = len(res.criteria_failed or [])
+        n_missing = len(res.missing_fields or [])
+        n_passed = len(res.criteria_passed or [])
         ranked.append(
             {
                 "trial_id": t.get("trial_id"),
                 "title": t.get("title"),
                 "phase": t.get("phase"),
                 "status": res.status,
-                "missing_fields_count": len(res.missing_fields or []),
-                "failed_criteria_count": len(res.criteria_failed or []),
-                "passed_checks_count": len(res.criteria_passed or []),
-                "closeness": _trial_closeness(patient, t),
+                "missing_fields_count": n_missing,
+                "failed_criteria_count": n_failed,
+                "passed_checks_count": n_passed,
+                "closeness": closeness,
+                # Rank tuple, lower is better; built once per trial so the
+                # sort's key callback is a plain itemgetter, not recomputation.
+                "_rank_key": (
+                    _STATUS_PRIORITY.get(res.status, 99),
+                    n_failed,                       # fewer failures better
+                    n_missing,                      # fewer missing fields better
+                    closeness,                      # closer to inclusion ranges better
+                    _phase_rank(t.get("phase", "")),
+                    -n_passed,                      # more passes better
+                ),
                 "_trial": t,
                 "_res": res,
             }
         )
 
-    ranked.sort(key=lambda r: rank_key(patient, r["_trial"], r["_res"]))
+    ranked.sort(key=operator.itemgetter("_rank_key"))
     return ranked
 
 
@@ -150,11 +530,68 @@ if not PATIENTS_PATH.exists():
     st.warning("No synthetic data found yet. Generate it first:\n\n`python -m data.generate_synthetic_data --n 80`")
     st.stop()
 
-patients = load_json(PATIENTS_PATH)
-notes = load_json(NOTES_PATH) if NOTES_PATH.exists() else []
-trials = load_json(TRIALS_PATH)
+patients = load_json(PATIENTS_PATH, PATIENTS_PATH.stat().st_mtime)
+notes = load_json(NOTES_PATH, NOTES_PATH.stat().st_mtime) if NOTES_PATH.exists() else []
+trials = load_json(TRIALS_PATH, TRIALS_PATH.stat().st_mtime)
+patients_df = load_patients_df(PATIENTS_PATH, PATIENTS_PATH.stat().st_mtime)
+
+notes_by_pid = build_notes_by_pid(notes) if notes else {}
+patients_by_pid = build_patients_by_pid(patients)
+
+screen_matrix = build_screen_matrix(patients, trials)
+closeness_matrix = build_closeness_matrix(patients, trials)
+compiled_trials(trials)  # warm the rule-plan cache before the first click
+
+patients_digest = hashlib.blake2b(PATIENTS_PATH.read_bytes()).hexdigest()[:16]
+trials_digest = hashlib.blake2b(TRIALS_PATH.read_bytes()).hexdigest()[:16]
 
-notes_by_pid = {n.get("patient_id"): n.get("note", "") for n in notes} if notes else {}
+
+@st.cache_data
+def overview_df(trial_id: str, patients_hash: str, trials_hash: str, _trial: dict) -> pd.DataFrame:
+    """Overview table keyed on (trial, patient data) only, so unrelated widget
+    changes (patient selection, status filter) reuse the cached frame; the
+    trials digest keys the entry to the trial file's content so editing
+    data/trials.json mid-session invalidates it like the other caches."""
+    return screen_cohort_overview(patients, _trial, patients_df)
+
+
+@st.fragment
+def patient_snapshot_panel(trial: dict, pid_list: list[str]) -> None:
+    """Per-patient drilldown; as a fragment, changing the selected patient
+    reruns only this panel, not the whole script."""
+    pid = st.selectbox("Select patient", pid_list, key="trial_mode_pid")
+    p = patients_by_pid[pid]
+    note = notes_by_pid.get(pid, "")
+    res = screen_matrix[(pid, trial.get("trial_id"))]
+
+    a, b = st.columns(2)
+    with a:
+        st.metric("Rule-based status", res.status)
+    with b:
+        st.metric("Missing fields", str(len(res.missing_fields)))
+
+    st.write("**Structured data**")
+    st.json(p, expanded=False)
+
+    st.write("**Clinical note (unstructured)**")
+    st.text_area("note", value=note, height=180, key="trial_mode_note")
+
+    st.divider()
+    st.write("**Rule-based explanation**")
+    st.write("- " + "\n- ".join(res.reasons))
+    if res.criteria_failed:
+        st.write("**Failed criteria:**")
+        st.write("- " + "\n- ".join(res.criteria_failed))
+    if res.criteria_passed:
+        st.write("**Passed checks:**")
+        st.write("- " + "\n- ".join(res.criteria_passed))
+    if res.missing_fields:
+        st.write("**Missing fields:**")
+        st.write("- " + "\n- ".join(res.missing_fields))
+
+    st.divider()
+    st.write("### 🤖 Gemini explanation")
+    gemini_explanation_section(p, note, trial, res, key="trial_mode_gemini")
 
 # Sidebar controls
 st.sidebar.header("Controls")
@@ -180,24 +617,7 @@ if mode == "Trial → Patients":
     trial_label = st.sidebar.selectbox("Select clinical trial", list(trial_title_map.keys()))
     trial = trial_title_map[trial_label]
 
-    rows = []
-    for p in patients:
-        res = screen_patient_for_trial(p, trial)
-        rows.append(
-            {
-                "patient_id": p.get("patient_id"),
-                "age": p.get("age_years"),
-                "sex": p.get("sex"),
-                "hba1c": p.get("hba1c_percent"),
-                "bmi": p.get("bmi"),
-                "egfr": p.get("egfr"),
-                "status": res.status,
-                "why_rule_based": " | ".join(res.reasons),
-                "_res": res,
-            }
-        )
-
-    df = pd.DataFrame(rows)
+    df = overview_df(trial.get("trial_id"), patients_digest, trials_digest, trial)
     df_view = df[df["status"].isin(status_filter)].copy()
 
     col1, col2 = st.columns([1.15, 0.85], gap="large")
@@ -205,7 +625,7 @@ if mode == "Trial → Patients":
     with col1:
         st.subheader("📋 Patients")
         st.dataframe(
-            df_view.drop(columns=["_res"]),
+            df_view,
             use_container_width=True,
             hide_index=True,
         )
@@ -213,73 +633,33 @@ if mode == "Trial → Patients":
     with col2:
         st.subheader("👤 Patient Snapshot")
         pid_list = df_view["patient_id"].tolist() if len(df_view) else df["patient_id"].tolist()
-        pid = st.selectbox("Select patient", pid_list, key="trial_mode_pid")
-        p = next(x for x in patients if x.get("patient_id") == pid)
-        note = get_note(notes_by_pid, pid)
-        res = screen_patient_for_trial(p, trial)
-
-        a, b = st.columns(2)
-        with a:
-            st.metric("Rule-based status", res.status)
-        with b:
-            st.metric("Missing fields", str(len(res.missing_fields)))
-
-        st.write("**Structured data**")
-        st.json(p, expanded=False)
-
-        st.write("**Clinical note (unstructured)**")
-        st.text_area("note", value=note, height=180, key="trial_mode_note")
-
-        st.divider()
-        st.write("**Rule-based explanation**")
-        st.write("- " + "\n- ".join(res.reasons))
-        if res.criteria_failed:
-            st.write("**Failed criteria:**")
-            st.write("- " + "\n- ".join(res.criteria_failed))
-        if res.criteria_passed:
-            st.write("**Passed checks:**")
-            st.write("- " + "\n- ".join(res.criteria_passed))
-        if res.missing_fields:
-            st.write("**Missing fields:**")
-            st.write("- " + "\n- ".join(res.missing_fields))
-
-        st.divider()
-        st.write("### 🤖 Gemini explanation")
-        if st.button("Explain with Gemini (LLM)", type="primary", key="trial_mode_gemini"):
-            with st.spinner("Calling Gemini..."):
-                out = explain_eligibility_with_gemini(
-                    patient=p,
-                    clinical_note=note,
-                    trial=trial,
-                    rule_based=res,
-                )
-            st.success("Done")
-            st.json(out, expanded=True)
+        patient_snapshot_panel(trial, pid_list)
 
 # ---------- Mode 2: Patient → Trial ranking (NEW) ----------
 else:
     st.subheader("🎯 Patient → Trial ranking")
 
     pid = st.selectbox("Select patient", [p.get("patient_id") for p in patients], key="rank_mode_pid")
-    patient = next(p for p in patients if p.get("patient_id") == pid)
-    note = get_note(notes_by_pid, pid)
+    patient = patients_by_pid[pid]
+    note = notes_by_pid.get(pid, "")
 
-    ranked = screen_and_rank_trials_for_patient(patient, trials)
+    ranked = screen_and_rank_trials_for_patient(
+        patient, trials, _matrix=screen_matrix, _closeness=closeness_matrix
+    )
 
+    # Build the display frame column-wise: no per-row dict allocation and no
+    # post-hoc drop() copy before st.dataframe.
     df_ranked = pd.DataFrame(
-        [
-            {
-                "trial_id": r["trial_id"],
-                "title": r["title"],
-                "phase": r["phase"],
-                "status": r["status"],
-                "failed_criteria": r["failed_criteria_count"],
-                "missing_fields": r["missing_fields_count"],
-                "passed_checks": r["passed_checks_count"],
-                "closeness": r["closeness"],
-            }
-            for r in ranked
-        ]
+        {
+            "trial_id": [r["trial_id"] for r in ranked],
+            "title": [r["title"] for r in ranked],
+            "phase": [r["phase"] for r in ranked],
+            "status": [r["status"] for r in ranked],
+            "failed_criteria": [r["failed_criteria_count"] for r in ranked],
+            "missing_fields": [r["missing_fields_count"] for r in ranked],
+            "passed_checks": [r["passed_checks_count"] for r in ranked],
+            "closeness": [r["closeness"] for r in ranked],
+        }
     )
     df_ranked = df_ranked[df_ranked["status"].isin(status_filter)].copy()
 
@@ -299,9 +679,9 @@ else:
 
         # Use the *full* ranked list for drill-down (even if filtered),
         # otherwise the index mapping becomes confusing.
-        options = [f'{r["trial_id"]} — {r["title"]} ({r["status"]})' for r in ranked]
-        chosen = st.selectbox("Select trial", options, key="rank_mode_trial_pick")
-        r = ranked[options.index(chosen)]
+        options = {f'{r["trial_id"]} — {r["title"]} ({r["status"]})': r for r in ranked}
+        chosen = st.selectbox("Select trial", list(options), key="rank_mode_trial_pick")
+        r = options[chosen]
         trial = r["_trial"]
         res = r["_res"]
 
@@ -326,14 +706,5 @@ else:
 
         st.divider()
         st.write("### 🤖 Gemini explanation (selected trial)")
-        if st.button("Explain with Gemini (LLM)", type="primary", key="rank_mode_gemini"):
-            with st.spinner("Calling Gemini..."):
-                out = explain_eligibility_with_gemini(
-                    patient=patient,
-                    clinical_note=note,
-                    trial=trial,
-                    rule_based=res,
-                )
-            st.success("Done")
-            st.json(out, expanded=True)
+        gemini_explanation_section(patient, note, trial, res, key="rank_mode_gemini")
 
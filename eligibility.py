@@ -8,29 +8,133 @@ Outputs a status:
 - "Uncertain" (missing required data)
 """
 from __future__ import annotations
+import json
+import sys
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
 
 Status = str  # Eligible / Not eligible / Uncertain
 
 def _norm_list(x):
+    # Interning the normalized tokens lets later set operations against the
+    # (equally interned) trial vocabularies hit the identity fast path.
     if x is None:
         return None
     if isinstance(x, list):
-        return [str(v).strip().lower() for v in x]
-    return [str(x).strip().lower()]
+        return [sys.intern(str(v).strip().lower()) for v in x]
+    return [sys.intern(str(x).strip().lower())]
+
+def _norm_frozenset(x) -> Optional[frozenset]:
+    vals = _norm_list(x)
+    return None if vals is None else frozenset(vals)
+
+def _vocab(values) -> frozenset:
+    """Lowercased, interned criterion vocabulary (built once per trial)."""
+    return frozenset(sys.intern(str(v).lower()) for v in values)
 
-def _has_any(hay: List[str], needles: List[str]) -> bool:
-    hay_set = set(hay)
-    return any(n.lower() in hay_set for n in needles)
+def _has_any(hay_set: frozenset, needle_set: frozenset) -> bool:
+    return not hay_set.isdisjoint(needle_set)
 
-def _has_all(hay: List[str], needles: List[str]) -> bool:
-    hay_set = set(hay)
-    return all(n.lower() in hay_set for n in needles)
+def _has_all(hay_set: frozenset, needle_set: frozenset) -> bool:
+    return needle_set <= hay_set
 
 def _missing(*values) -> bool:
     return any(v is None for v in values)
 
+@dataclass(frozen=True)
+class PatientView:
+    """
+    Per-patient membership sets, normalized once per screening call.
+
+    Checks used to rebuild set(hay) from the raw medication/diagnosis lists on
+    every criterion; with several med-criteria per trial that re-hashed the
+    same lists repeatedly. None means the field is missing.
+    """
+    diagnoses: Optional[frozenset]
+    medications: Optional[frozenset]
+
+    @classmethod
+    def from_patient(cls, patient: Dict[str, Any]) -> "PatientView":
+        return cls(
+            diagnoses=_norm_frozenset(patient.get("diagnoses")),
+            medications=_norm_frozenset(patient.get("medications")),
+        )
+
+# Cohort column sets; numeric fields are stored as float arrays with NaN for
+# missing, flag fields as plain bool arrays (absent/None counts as False,
+# matching the scalar engine's `is True` checks).
+_COHORT_NUMERIC_FIELDS = [
+    "age_years", "hba1c_percent", "bmi", "egfr", "uacr_mg_g",
+    "metformin_stable_months", "recent_mi_or_stroke_months",
+]
+
+@dataclass
+class PatientCohort:
+    """
+    Columnar (struct-of-arrays) layout for a patient cohort.
+
+    A list of per-patient dicts makes every field read a hash lookup and a
+    pointer chase; storing one contiguous array per field means scanning a
+    single field across the cohort walks sequential memory. List-valued
+    fields are kept as per-row normalized frozensets — that is the form the
+    membership checks consume — and `pregnant` stays tri-state
+    (True/False/None, since missing is meaningful there).
+
+    Per-patient dicts remain the interchange format at the single-patient
+    boundary (forms, LLM payloads); build a cohort once per data load and
+    pass it to `screen_cohort_for_trial` so each trial screening reuses the
+    extracted columns instead of re-deriving them.
+    """
+    patient_ids: np.ndarray
+    numeric: Dict[str, np.ndarray]
+    flags: Dict[str, np.ndarray]
+    pregnant: np.ndarray
+    diagnoses: List[Optional[frozenset]]
+    medications: List[Optional[frozenset]]
+
+    def __len__(self) -> int:
+        return len(self.patient_ids)
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> "PatientCohort":
+        numeric = {
+            f: np.array(
+                [r.get(f) if r.get(f) is not None else np.nan for r in records],
+                dtype=float,
+            )
+            for f in _COHORT_NUMERIC_FIELDS
+        }
+        flags = {
+            f: np.array([r.get(f) is True for r in records], dtype=bool)
+            for f in ["type1_diabetes"] + _BOOL_EXCLUSION_FLAGS
+        }
+        return cls(
+            patient_ids=np.array([r.get("patient_id") for r in records], dtype=object),
+            numeric=numeric,
+            flags=flags,
+            pregnant=np.array([r.get("pregnant") for r in records], dtype=object),
+            diagnoses=[_norm_frozenset(r.get("diagnoses")) for r in records],
+            medications=[_norm_frozenset(r.get("medications")) for r in records],
+        )
+
+# Numeric inclusion criteria in engine order:
+# (field, "too low" template, "too high" template, "pass" message template).
+# The "too high" template is None for min-only criteria.
+_NUMERIC_INCLUSIONS = [
+    ("age_years", "Age {v} < {lo}", "Age {v} > {hi}", "Age within [{lo},{hi}]"),
+    ("hba1c_percent", "HbA1c {v}% < {lo}%", "HbA1c {v}% > {hi}%", "HbA1c within [{lo},{hi}]"),
+    ("bmi", "BMI {v} < {lo}", "BMI {v} > {hi}", "BMI within [{lo},{hi}]"),
+    ("egfr", "eGFR {v} < {lo}", "eGFR {v} > {hi}", "eGFR within range"),
+    ("uacr_mg_g", "UACR {v} < {lo}", None, "UACR meets minimum"),
+    ("metformin_stable_months", "Metformin not stable >= {lo} months", None, "Metformin stable long enough"),
+]
+
+_BOOL_EXCLUSION_FLAGS = ["severe_renal_impairment", "eating_disorder", "dialysis", "kidney_transplant"]
+
 @dataclass
 class ScreenResult:
     status: Status
@@ -39,190 +143,195 @@ class ScreenResult:
     criteria_passed: List[str]
     criteria_failed: List[str]
 
-def screen_patient_for_trial(patient: Dict[str, Any], trial: Dict[str, Any]) -> ScreenResult:
+# A compiled check takes (patient, view) — `view` carries the membership
+# sets built once per patient — and returns ("pass"|"fail"|"missing",
+# payload), where payload is the message (pass/fail) or the missing field name.
+CheckFn = Callable[[Dict[str, Any], PatientView], Tuple[str, str]]
+
+@dataclass
+class CompiledTrial:
+    """One trial's criteria partially evaluated into a flat list of checks."""
+    checks: List[CheckFn]
+
+def _make_numeric_check(key, lo, hi, low_tpl, high_tpl, pass_msg) -> CheckFn:
     """
-    Screen a single patient against a single trial JSON.
+    Single range-check used for every numeric criterion.
 
-    IMPORTANT: The trial JSON is intended to be readable and explainable.
-    Rule checks are implemented for a limited set of criterion types used in this demo.
+    Which bounds exist is decided here, at compile time, so the per-patient
+    closure only runs the comparisons that can actually fire instead of
+    re-testing `is not None` on each call.
     """
-    reasons: List[str] = []
-    missing: List[str] = []
-    passed: List[str] = []
-    failed: List[str] = []
+    check_lo = lo is not None
+    check_hi = high_tpl is not None and hi is not None
 
+    def check(patient, view):
+        v = patient.get(key)
+        if v is None:
+            return ("missing", key)
+        if check_lo and v < lo:
+            return ("fail", low_tpl.format(v=v, lo=lo, hi=hi))
+        if check_hi and v > hi:
+            return ("fail", high_tpl.format(v=v, lo=lo, hi=hi))
+        return ("pass", pass_msg)
+    return check
+
+def compile_trial(trial: Dict[str, Any]) -> CompiledTrial:
+    """
+    Partially evaluate a trial JSON into a list of check closures.
+
+    A trial rarely changes but is screened against many patients, so the
+    per-criterion branching, bound lookups, and static message strings are
+    all resolved here, once; screening a patient is then just running the
+    closures. Failure messages are the only strings formatted at run time.
+    """
     inc = trial.get("inclusion", {})
     exc = trial.get("exclusion", {})
+    checks: List[CheckFn] = []
 
-    # Pull patient fields
-    age = patient.get("age_years")
-    diagnoses = _norm_list(patient.get("diagnoses"))
-    hba1c = patient.get("hba1c_percent")
-    bmi = patient.get("bmi")
-    egfr = patient.get("egfr")
-    uacr = patient.get("uacr_mg_g")
-    meds = _norm_list(patient.get("medications"))
-    preg = patient.get("pregnant")
-    met_stable = patient.get("metformin_stable_months")
-    recent_evt = patient.get("recent_mi_or_stroke_months")
-    type1 = patient.get("type1_diabetes")
-
-    # === Inclusion checks ===
-    # Age
-    if "age_years" in inc:
-        lo = inc["age_years"].get("min")
-        hi = inc["age_years"].get("max")
-        if age is None:
-            missing.append("age_years")
-        else:
-            if lo is not None and age < lo:
-                failed.append(f"Age {age} < {lo}")
-            elif hi is not None and age > hi:
-                failed.append(f"Age {age} > {hi}")
-            else:
-                passed.append(f"Age within [{lo},{hi}]")
+    numeric_specs = {key: spec for key, *spec in _NUMERIC_INCLUSIONS}
+
+    def add_numeric(key: str) -> None:
+        if key in inc:
+            low_tpl, high_tpl, pass_tpl = numeric_specs[key]
+            lo, hi = inc[key].get("min"), inc[key].get("max")
+            checks.append(
+                _make_numeric_check(key, lo, hi, low_tpl, high_tpl, pass_tpl.format(lo=lo, hi=hi))
+            )
+
+    # === Inclusion checks (engine order) ===
+    add_numeric("age_years")
 
-    # Diagnosis (any)
     if "diagnoses_any" in inc:
-        if diagnoses is None:
-            missing.append("diagnoses")
-        else:
-            if not _has_any(diagnoses, inc["diagnoses_any"]):
-                failed.append("Does not have required T2D diagnosis")
-            else:
-                passed.append("Has required T2D diagnosis")
-
-    # HbA1c
-    if "hba1c_percent" in inc:
-        lo = inc["hba1c_percent"].get("min")
-        hi = inc["hba1c_percent"].get("max")
-        if hba1c is None:
-            missing.append("hba1c_percent")
-        else:
-            if lo is not None and hba1c < lo:
-                failed.append(f"HbA1c {hba1c}% < {lo}%")
-            elif hi is not None and hba1c > hi:
-                failed.append(f"HbA1c {hba1c}% > {hi}%")
-            else:
-                passed.append(f"HbA1c within [{lo},{hi}]")
-
-    # BMI
-    if "bmi" in inc:
-        lo = inc["bmi"].get("min")
-        hi = inc["bmi"].get("max")
-        if bmi is None:
-            missing.append("bmi")
-        else:
-            if lo is not None and bmi < lo:
-                failed.append(f"BMI {bmi} < {lo}")
-            elif hi is not None and bmi > hi:
-                failed.append(f"BMI {bmi} > {hi}")
-            else:
-                passed.append(f"BMI within [{lo},{hi}]")
-
-    # eGFR
-    if "egfr" in inc:
-        lo = inc["egfr"].get("min")
-        hi = inc["egfr"].get("max")
-        if egfr is None:
-            missing.append("egfr")
-        else:
-            if lo is not None and egfr < lo:
-                failed.append(f"eGFR {egfr} < {lo}")
-            elif hi is not None and egfr > hi:
-                failed.append(f"eGFR {egfr} > {hi}")
-            else:
-                passed.append("eGFR within range")
+        def check_diagnoses(patient, view, needles=_vocab(inc["diagnoses_any"])):
+            if view.diagnoses is None:
+                return ("missing", "diagnoses")
+            if not _has_any(view.diagnoses, needles):
+                return ("fail", "Does not have required T2D diagnosis")
+            return ("pass", "Has required T2D diagnosis")
+        checks.append(check_diagnoses)
 
-    # UACR
-    if "uacr_mg_g" in inc:
-        lo = inc["uacr_mg_g"].get("min")
-        if uacr is None:
-            missing.append("uacr_mg_g")
-        else:
-            if lo is not None and uacr < lo:
-                failed.append(f"UACR {uacr} < {lo}")
-            else:
-                passed.append("UACR meets minimum")
+    add_numeric("hba1c_percent")
+    add_numeric("bmi")
+    add_numeric("egfr")
+    add_numeric("uacr_mg_g")
 
-    # Medications: all
     if "medications_all" in inc:
-        if meds is None:
-            missing.append("medications")
-        else:
-            if not _has_all(meds, inc["medications_all"]):
-                failed.append("Missing required meds: " + ", ".join(inc["medications_all"]))
-            else:
-                passed.append("Has all required meds")
+        fail_msg = "Missing required meds: " + ", ".join(inc["medications_all"])
+        def check_meds_all(patient, view, needles=_vocab(inc["medications_all"]), fail_msg=fail_msg):
+            if view.medications is None:
+                return ("missing", "medications")
+            if not _has_all(view.medications, needles):
+                return ("fail", fail_msg)
+            return ("pass", "Has all required meds")
+        checks.append(check_meds_all)
 
-    # Medications: any
     if "medications_any" in inc:
-        if meds is None:
-            missing.append("medications")
-        else:
-            if not _has_any(meds, inc["medications_any"]):
-                failed.append("Does not use any of the allowed background meds")
-            else:
-                passed.append("Has an allowed background medication")
+        def check_meds_any(patient, view, needles=_vocab(inc["medications_any"])):
+            if view.medications is None:
+                return ("missing", "medications")
+            if not _has_any(view.medications, needles):
+                return ("fail", "Does not use any of the allowed background meds")
+            return ("pass", "Has an allowed background medication")
+        checks.append(check_meds_any)
 
-    # Metformin stable months
-    if "metformin_stable_months" in inc:
-        lo = inc["metformin_stable_months"].get("min")
-        if met_stable is None:
-            missing.append("metformin_stable_months")
-        else:
-            if lo is not None and met_stable < lo:
-                failed.append(f"Metformin not stable >= {lo} months")
-            else:
-                passed.append("Metformin stable long enough")
+    add_numeric("metformin_stable_months")
 
-    # === Exclusion checks ===
-    # Pregnant
+    # === Exclusion checks (engine order) ===
     if exc.get("pregnant") is True:
-        if preg is None:
-            missing.append("pregnant")
-        elif preg is True:
-            failed.append("Pregnant (exclusion)")
-        else:
-            passed.append("Not pregnant")
+        def check_pregnant(patient, view):
+            preg = patient.get("pregnant")
+            if preg is None:
+                return ("missing", "pregnant")
+            if preg is True:
+                return ("fail", "Pregnant (exclusion)")
+            return ("pass", "Not pregnant")
+        checks.append(check_pregnant)
 
-    # Any of these medications exclude
     if "medications_any" in exc:
-        if meds is None:
-            missing.append("medications")
-        else:
-            if _has_any(meds, exc["medications_any"]):
-                failed.append("Uses excluded meds: " + ", ".join(exc["medications_any"]))
-            else:
-                passed.append("No excluded meds")
+        fail_msg = "Uses excluded meds: " + ", ".join(exc["medications_any"])
+        def check_excluded_meds(patient, view, needles=_vocab(exc["medications_any"]), fail_msg=fail_msg):
+            if view.medications is None:
+                return ("missing", "medications")
+            if _has_any(view.medications, needles):
+                return ("fail", fail_msg)
+            return ("pass", "No excluded meds")
+        checks.append(check_excluded_meds)
 
-    # Recent MI/stroke
     if "recent_mi_or_stroke_months" in exc:
         max_m = exc["recent_mi_or_stroke_months"].get("max")
-        if recent_evt is None:
-            # It's okay to be None; it means no known event.
-            passed.append("No documented recent MI/stroke")
-        else:
-            if max_m is not None and recent_evt <= max_m:
-                failed.append(f"Recent MI/stroke within {max_m} months")
-            else:
-                passed.append("MI/stroke not within exclusion window")
+        fail_msg = f"Recent MI/stroke within {max_m} months"
+        def check_recent_event(patient, view, max_m=max_m, fail_msg=fail_msg):
+            v = patient.get("recent_mi_or_stroke_months")
+            if v is None:
+                # It's okay to be None; it means no known event.
+                return ("pass", "No documented recent MI/stroke")
+            if max_m is not None and v <= max_m:
+                return ("fail", fail_msg)
+            return ("pass", "MI/stroke not within exclusion window")
+        checks.append(check_recent_event)
 
-    # Type1 diabetes
     if exc.get("type1_diabetes") is True:
-        if type1 is True:
-            failed.append("Type 1 diabetes (exclusion)")
-        else:
-            passed.append("Not type 1 diabetes")
+        def check_type1(patient, view):
+            if patient.get("type1_diabetes") is True:
+                return ("fail", "Type 1 diabetes (exclusion)")
+            return ("pass", "Not type 1 diabetes")
+        checks.append(check_type1)
 
-    # Trial-specific boolean exclusions
-    for flag in ["severe_renal_impairment", "eating_disorder", "dialysis", "kidney_transplant"]:
+    for flag in _BOOL_EXCLUSION_FLAGS:
         if exc.get(flag) is True:
-            v = patient.get(flag)
-            if v is True:
-                failed.append(f"{flag} (exclusion)")
-            else:
-                passed.append(f"{flag} not present")
+            def check_flag(patient, view, flag=flag,
+                           fail_msg=f"{flag} (exclusion)", pass_msg=f"{flag} not present"):
+                if patient.get(flag) is True:
+                    return ("fail", fail_msg)
+                return ("pass", pass_msg)
+            checks.append(check_flag)
+
+    return CompiledTrial(checks=checks)
+
+@lru_cache(maxsize=64)
+def _compiled_trial_from_json(trial_json: str) -> CompiledTrial:
+    return compile_trial(json.loads(trial_json))
+
+def _compile_trial_cached(trial: Dict[str, Any]) -> CompiledTrial:
+    """Memoized compile keyed by a canonical serialization of the trial."""
+    return _compiled_trial_from_json(json.dumps(trial, sort_keys=True))
+
+def screen_patient_for_trial(patient: Dict[str, Any], trial: Dict[str, Any]) -> ScreenResult:
+    """
+    Screen a single patient against a single trial JSON.
+
+    IMPORTANT: The trial JSON is intended to be readable and explainable.
+    Rule checks are implemented for a limited set of criterion types used in this demo.
+
+    The trial is compiled (and memoized) into a flat check plan by
+    `compile_trial`; per-patient work is just running the checks.
+    """
+    compiled = _compile_trial_cached(trial)
+
+    view = PatientView.from_patient(patient)
+
+    reasons: List[str] = []
+    missing: List[str] = []
+    passed: List[str] = []
+    failed: List[str] = []
+    # Dedup at append time (only `missing` can actually repeat — e.g.
+    # "medications" from several criteria) so no sorted(set(...)) pass is
+    # needed at exit; the lists keep stable engine order.
+    seen: set = set()
+
+    def _add(lst: List[str], item: str) -> None:
+        if item not in seen:
+            seen.add(item)
+            lst.append(item)
+
+    for check in compiled.checks:
+        outcome, payload = check(patient, view)
+        if outcome == "pass":
+            _add(passed, payload)
+        elif outcome == "fail":
+            _add(failed, payload)
+        else:
+            _add(missing, payload)
 
     # === Decide status ===
     # If ANY required inclusion field is missing, we return Uncertain (even if other things fail/pass),
@@ -233,21 +342,16 @@ def screen_patient_for_trial(patient: Dict[str, Any], trial: Dict[str, Any]) ->
 
     if not decisive_failure and len(missing) > 0:
         status = "Uncertain"
-        reasons.append("Missing required information: " + ", ".join(sorted(set(missing))))
+        reasons.append("Missing required information: " + ", ".join(missing))
     elif decisive_failure:
         status = "Not eligible"
         reasons.append("One or more criteria failed: " + "; ".join(failed))
         if len(missing) > 0:
-            reasons.append("Also missing info: " + ", ".join(sorted(set(missing))))
+            reasons.append("Also missing info: " + ", ".join(missing))
     else:
         status = "Eligible"
         reasons.append("All checked criteria passed, no exclusions triggered.")
 
-    # Deduplicate lists
-    missing = sorted(set(missing))
-    passed = sorted(set(passed))
-    failed = sorted(set(failed))
-
     return ScreenResult(
         status=status,
         reasons=reasons,
@@ -255,3 +359,245 @@ def screen_patient_for_trial(patient: Dict[str, Any], trial: Dict[str, Any]) ->
         criteria_passed=passed,
         criteria_failed=failed,
     )
+
+
+# === Vectorized cohort screening ===
+def _norm_set(x) -> Optional[set]:
+    """Normalized membership set for a list-valued field (None stays None)."""
+    if isinstance(x, (list, tuple, np.ndarray)):
+        return {str(v).strip().lower() for v in x}
+    return None
+
+
+def screen_cohort_for_trial(
+    patients_df: pd.DataFrame,
+    trial: Dict[str, Any],
+    records: Optional[List[Dict[str, Any]]] = None,
+    cohort: Optional[PatientCohort] = None,
+) -> pd.DataFrame:
+    """
+    Screen a whole patient cohort against one trial with vectorized masks.
+
+    The realistic workload is one trial against many patients; instead of
+    running the Python rule tree per patient, each criterion becomes one
+    column-wise comparison (numeric ranges as NumPy ufuncs, list fields as
+    per-row normalized sets built once) and the final status is a single
+    np.select over the combined masks.
+
+    `records`, when given, supplies the original patient dicts purely for
+    failure-message formatting (DataFrame numeric columns coerce ints to
+    floats); it must be row-aligned with `patients_df`. `cohort`, when
+    given, supplies precomputed columns (numeric arrays, flag arrays,
+    membership frozensets) so screening one trial after another skips
+    re-extracting and re-normalizing them from the DataFrame each call.
+
+    Returns a DataFrame indexed like `patients_df` with the same fields as
+    ScreenResult: status, reasons, missing_fields, criteria_passed,
+    criteria_failed. Output is identical to screen_patient_for_trial per row;
+    the scalar function remains the reference implementation.
+    """
+    n = len(patients_df)
+    inc = trial.get("inclusion", {})
+    exc = trial.get("exclusion", {})
+
+    any_fail = np.zeros(n, dtype=bool)
+    any_missing = np.zeros(n, dtype=bool)
+    # Events in engine order; messages are shared strings except for failures,
+    # which are formatted lazily for failing rows only.
+    fail_events: List[tuple] = []  # (mask, message_or_builder)
+    pass_events: List[tuple] = []  # (mask, message)
+    miss_events: List[tuple] = []  # (mask, field_name)
+
+    def numeric_col(name: str) -> np.ndarray:
+        if cohort is not None:
+            return cohort.numeric[name]
+        if name in patients_df.columns:
+            return pd.to_numeric(patients_df[name], errors="coerce").to_numpy(dtype=float)
+        return np.full(n, np.nan)
+
+    def is_true(name: str) -> np.ndarray:
+        if cohort is not None:
+            return cohort.flags[name]
+        if name in patients_df.columns:
+            return (patients_df[name] == True).to_numpy()  # noqa: E712  (None-safe)
+        return np.zeros(n, dtype=bool)
+
+    def raw_values(name: str) -> list:
+        if records is not None:
+            return [r.get(name) for r in records]
+        if name in patients_df.columns:
+            return patients_df[name].tolist()
+        return [None] * n
+
+    def add_fail(mask: np.ndarray, message) -> None:
+        nonlocal any_fail
+        any_fail |= mask
+        fail_events.append((mask, message))
+
+    def add_missing(mask: np.ndarray, field: str) -> None:
+        nonlocal any_missing
+        any_missing |= mask
+        miss_events.append((mask, field))
+
+    def add_numeric(key: str, low_tpl: str, high_tpl: Optional[str], pass_tpl: str) -> None:
+        if key not in inc:
+            return
+        lo, hi = inc[key].get("min"), inc[key].get("max")
+        v = numeric_col(key)
+        raw = raw_values(key)
+        present = ~np.isnan(v)
+        add_missing(~present, key)
+        with np.errstate(invalid="ignore"):
+            below = (v < lo) & present if lo is not None else np.zeros(n, dtype=bool)
+            if high_tpl is not None and hi is not None:
+                above = (v > hi) & present & ~below
+            else:
+                above = np.zeros(n, dtype=bool)
+        if below.any():
+            add_fail(below, lambda i, t=low_tpl, vv=raw, lo=lo, hi=hi: t.format(v=vv[i], lo=lo, hi=hi))
+        if above.any():
+            add_fail(above, lambda i, t=high_tpl, vv=raw, lo=lo, hi=hi: t.format(v=vv[i], lo=lo, hi=hi))
+        pass_events.append((present & ~below & ~above, pass_tpl.format(lo=lo, hi=hi)))
+
+    def list_sets(name: str) -> list:
+        if name in patients_df.columns:
+            return [_norm_set(x) for x in patients_df[name]]
+        return [None] * n
+
+    if cohort is not None:
+        diag_sets = cohort.diagnoses
+        med_sets = cohort.medications
+    else:
+        diag_sets = list_sets("diagnoses")
+        med_sets = list_sets("medications")
+
+    def add_membership(sets: list, needles, field: str, fail_msg: str, pass_msg: str, exclude: bool = False) -> None:
+        needle_set = {str(x).lower() for x in needles}
+        missing = np.array([s is None for s in sets])
+        if exclude:
+            fail = np.array([s is not None and not s.isdisjoint(needle_set) for s in sets])
+        else:
+            fail = np.array([s is not None and s.isdisjoint(needle_set) for s in sets])
+        add_missing(missing, field)
+        add_fail(fail, fail_msg)
+        pass_events.append((~missing & ~fail, pass_msg))
+
+    # === Inclusion checks (engine order) ===
+    add_numeric(*_NUMERIC_INCLUSIONS[0])  # age_years
+
+    if "diagnoses_any" in inc:
+        add_membership(
+            diag_sets, inc["diagnoses_any"], "diagnoses",
+            "Does not have required T2D diagnosis", "Has required T2D diagnosis",
+        )
+
+    for spec in _NUMERIC_INCLUSIONS[1:5]:  # hba1c, bmi, egfr, uacr
+        add_numeric(*spec)
+
+    if "medications_all" in inc:
+        needle_set = {str(x).lower() for x in inc["medications_all"]}
+        missing = np.array([s is None for s in med_sets])
+        fail = np.array([s is not None and not needle_set <= s for s in med_sets])
+        add_missing(missing, "medications")
+        add_fail(fail, "Missing required meds: " + ", ".join(inc["medications_all"]))
+        pass_events.append((~missing & ~fail, "Has all required meds"))
+
+    if "medications_any" in inc:
+        add_membership(
+            med_sets, inc["medications_any"], "medications",
+            "Does not use any of the allowed background meds",
+            "Has an allowed background medication",
+        )
+
+    add_numeric(*_NUMERIC_INCLUSIONS[5])  # metformin_stable_months
+
+    # === Exclusion checks (engine order) ===
+    if exc.get("pregnant") is True:
+        if cohort is not None:
+            missing = np.array([v is None for v in cohort.pregnant], dtype=bool)
+            fail = np.array([v is True for v in cohort.pregnant], dtype=bool)
+        elif "pregnant" in patients_df.columns:
+            missing = patients_df["pregnant"].isna().to_numpy()
+            fail = is_true("pregnant")
+        else:
+            missing = np.ones(n, dtype=bool)
+            fail = np.zeros(n, dtype=bool)
+        add_missing(missing, "pregnant")
+        add_fail(fail, "Pregnant (exclusion)")
+        pass_events.append((~missing & ~fail, "Not pregnant"))
+
+    if "medications_any" in exc:
+        add_membership(
+            med_sets, exc["medications_any"], "medications",
+            "Uses excluded meds: " + ", ".join(exc["medications_any"]),
+            "No excluded meds",
+            exclude=True,
+        )
+
+    if "recent_mi_or_stroke_months" in exc:
+        max_m = exc["recent_mi_or_stroke_months"].get("max")
+        v = numeric_col("recent_mi_or_stroke_months")
+        no_event = np.isnan(v)  # None means no known event, not missing data
+        with np.errstate(invalid="ignore"):
+            fail = (v <= max_m) & ~no_event if max_m is not None else np.zeros(n, dtype=bool)
+        pass_events.append((no_event, "No documented recent MI/stroke"))
+        add_fail(fail, f"Recent MI/stroke within {max_m} months")
+        pass_events.append((~no_event & ~fail, "MI/stroke not within exclusion window"))
+
+    if exc.get("type1_diabetes") is True:
+        fail = is_true("type1_diabetes")
+        add_fail(fail, "Type 1 diabetes (exclusion)")
+        pass_events.append((~fail, "Not type 1 diabetes"))
+
+    for flag in _BOOL_EXCLUSION_FLAGS:
+        if exc.get(flag) is True:
+            fail = is_true(flag)
+            add_fail(fail, f"{flag} (exclusion)")
+            pass_events.append((~fail, f"{flag} not present"))
+
+    # === Decide statuses and assemble per-row lists ===
+    status = np.select(
+        [any_fail, any_missing],
+        ["Not eligible", "Uncertain"],
+        default="Eligible",
+    )
+
+    failed: List[List[str]] = [[] for _ in range(n)]
+    missing_fields: List[List[str]] = [[] for _ in range(n)]
+    passed: List[List[str]] = [[] for _ in range(n)]
+    for mask, message in fail_events:
+        for i in np.flatnonzero(mask):
+            failed[i].append(message(i) if callable(message) else message)
+    for mask, field in miss_events:
+        for i in np.flatnonzero(mask):
+            missing_fields[i].append(field)
+    for mask, message in pass_events:
+        for i in np.flatnonzero(mask):
+            passed[i].append(message)
+
+    # Only missing fields can repeat (e.g. "medications" from several
+    # criteria); dedupe keeping engine order, matching the scalar engine.
+    missing_fields = [list(dict.fromkeys(m)) for m in missing_fields]
+
+    reasons: List[List[str]] = []
+    for i in range(n):
+        if any_fail[i]:
+            row = ["One or more criteria failed: " + "; ".join(failed[i])]
+            if missing_fields[i]:
+                row.append("Also missing info: " + ", ".join(missing_fields[i]))
+        elif any_missing[i]:
+            row = ["Missing required information: " + ", ".join(missing_fields[i])]
+        else:
+            row = ["All checked criteria passed, no exclusions triggered."]
+        reasons.append(row)
+
+    return pd.DataFrame(
+        {
+            "status": status,
+            "reasons": reasons,
+            "missing_fields": missing_fields,
+            "criteria_passed": passed,
+            "criteria_failed": failed,
+        },
+        index=patients_df.index,
+    )
@@ -7,15 +7,21 @@ Key design goals:
 - Robust parsing: request JSON output, parse carefully, and degrade gracefully.
 """
 from __future__ import annotations
-from dataclasses import asdict
+import asyncio
+from functools import lru_cache
 import json
 import os
 import re
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from google import genai
 from google.genai import types
 
+try:
+    import orjson  # compact serialization, ~5x faster than stdlib json
+except ImportError:  # pragma: no cover
+    orjson = None
+
 from eligibility import ScreenResult
 
 DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")  # fast & cheap default
@@ -74,24 +80,49 @@ Do not include markdown or extra text.
 
 """
 
+# Array variant used by the batched entry point: one explanation per trial.
+BATCH_SCHEMA_HINT = {"type": "array", "items": JSON_SCHEMA_HINT}
+
+# How many trials to pack into one LLM call. 1 (the default) means one call
+# per trial, i.e. batching is opt-in: larger batches amortize network latency
+# but can degrade per-trial answer quality.
+DEFAULT_MAX_PER_BATCH = int(os.getenv("GEMINI_MAX_PER_BATCH", "1"))
+
+# Sentinel distinguishing "never probed" from a probe that found no key, so
+# a missing-key result is cached too and repeat calls skip the streamlit
+# import and secrets lookup entirely.
+_UNSET = object()
+_STREAMLIT_KEY: Any = _UNSET
+
 def _get_api_key_from_streamlit_secrets_if_present() -> Optional[str]:
+    global _STREAMLIT_KEY
+    if _STREAMLIT_KEY is not _UNSET:
+        return _STREAMLIT_KEY
     # Avoid importing streamlit unless needed.
+    key = None
     try:
         import streamlit as st  # type: ignore
         if hasattr(st, "secrets"):
             # Common keys
             for k in ["GEMINI_API_KEY", "GOOGLE_API_KEY"]:
                 if k in st.secrets:
-                    return st.secrets[k]
+                    key = st.secrets[k]
+                    break
     except Exception:
         pass
-    return None
+    _STREAMLIT_KEY = key
+    return key
 
+@lru_cache(maxsize=1)
 def _make_client() -> genai.Client:
     """
-    Create a Gemini client.
+    Create (or return the cached) Gemini client.
     - Prefers environment variables (GEMINI_API_KEY or GOOGLE_API_KEY).
     - If running under Streamlit Community Cloud, it may be stored in st.secrets.
+
+    The client holds a connection pool, so building one per call both paid
+    setup cost each time and defeated connection reuse; a single process-wide
+    instance is safe to share. Call `reset_client()` if the key changes.
     """
     api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY") or _get_api_key_from_streamlit_secrets_if_present()
     if api_key:
@@ -99,66 +130,125 @@ def _make_client() -> genai.Client:
     # fall back to env auto-detection (may still work if set in environment)
     return genai.Client()
 
+def reset_client() -> None:
+    """Drop the cached client so the next call re-reads credentials."""
+    global _STREAMLIT_KEY
+    _STREAMLIT_KEY = _UNSET
+    _make_client.cache_clear()
+
 def _extract_json(text: str) -> str:
     """
     Extract JSON from a model response that may contain extra text.
+
+    The common case (response_mime_type is already JSON) short-circuits.
+    Otherwise a single pass finds the first balanced {...} block, tracking
+    string literals and escapes so a '}' inside a summary string does not
+    truncate the match — the old greedy regex got that wrong, and the scan
+    avoids spinning up the regex engine on every fallback. The regex remains
+    only as a last resort for unbalanced text.
     """
     text = text.strip()
     # If already looks like JSON, return
     if text.startswith("{") and text.endswith("}"):
         return text
-    # Try to find first {...} block
+    start = text.find("{")
+    if start != -1:
+        depth = 0
+        in_string = False
+        escape = False
+        for i in range(start, len(text)):
+            ch = text[i]
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == "{":
+                depth += 1
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+    # Unbalanced braces: last-resort greedy match
     m = re.search(r"\{.*\}", text, flags=re.DOTALL)
     if m:
         return m.group(0)
     return text
 
-def explain_eligibility_with_gemini(
-    patient: Dict[str, Any],
-    clinical_note: str,
-    trial: Dict[str, Any],
-    rule_based: ScreenResult,
-    model: str = DEFAULT_MODEL,
-    temperature: float = 0.2,
-) -> Dict[str, Any]:
-    """
-    Returns a JSON dict (already parsed) describing the explanation.
-    """
-    client = _make_client()
-
-    payload = {
-        "patient_structured": patient,
-        "patient_note_unstructured": clinical_note,
-        "trial": trial,
-        "rule_based_result": asdict(rule_based),
-        "required_output_schema": JSON_SCHEMA_HINT,
+def _rb_summary(rule_based: ScreenResult) -> Dict[str, Any]:
+    # Hand-built instead of asdict() (which deep-copies every list), and
+    # without `reasons`, which only restate the criteria lists below.
+    return {
+        "status": rule_based.status,
+        "criteria_passed": rule_based.criteria_passed,
+        "criteria_failed": rule_based.criteria_failed,
+        "missing_fields": rule_based.missing_fields,
     }
 
-    # Using a single prompt for simplicity; could be split into system+user.
-    prompt = (
+def _compact_json(obj: Any) -> str:
+    # Compact form: indentation only inflates the prompt's token count.
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+@lru_cache(maxsize=256)
+def _build_prompt(patient_json: str, note_json: str, trial_json: str, rb_json: str) -> str:
+    # Assembled from pre-serialized parts so the arguments are hashable and
+    # identical (patient, trial, result) inputs — e.g. Streamlit reruns before
+    # the app-level cache warms — reuse the same prompt string.
+    payload = (
+        '{"patient_structured":' + patient_json
+        + ',"patient_note_unstructured":' + note_json
+        + ',"trial":' + trial_json
+        + ',"rule_based_result":' + rb_json + "}"
+    )
+    return (
         SYSTEM_INSTRUCTIONS
         + "\n\nINPUT:\n"
-        + json.dumps(payload, ensure_ascii=False, indent=2)
+        + payload
         + "\n\nOUTPUT: Return ONLY JSON, no extra text."
     )
 
-    # Try to request JSON output (best-effort)
-    config = types.GenerateContentConfig(
-        temperature=temperature,
-        response_mime_type="application/json",
+def _single_prompt(
+    patient: Dict[str, Any],
+    clinical_note: str,
+    trial: Dict[str, Any],
+    rule_based: ScreenResult,
+) -> str:
+    # Using a single prompt for simplicity; could be split into system+user.
+    return _build_prompt(
+        _compact_json(patient),
+        _compact_json(clinical_note),
+        _compact_json(trial),
+        _compact_json(_rb_summary(rule_based)),
     )
 
-    resp = client.models.generate_content(
-        model=model,
-        contents=prompt,
-        config=config,
+def _single_config(temperature: float) -> types.GenerateContentConfig:
+    # Request schema-constrained JSON output. Passing the schema via config
+    # means it is no longer re-serialized into every prompt (it used to ride
+    # along in the payload as "required_output_schema"), and the API enforces
+    # the structure server-side instead of relying on the instructions alone.
+    return types.GenerateContentConfig(
+        temperature=temperature,
+        response_mime_type="application/json",
+        response_schema=JSON_SCHEMA_HINT,
     )
 
-    text = getattr(resp, "text", None) or str(resp)
-    raw = _extract_json(text)
+def _parse_single_response(text: str, rule_based: ScreenResult) -> Dict[str, Any]:
+    # response_schema makes the server emit conforming JSON, so the raw text
+    # parses directly on the happy path; extraction is only needed when the
+    # response is wrapped in extra prose despite that.
+    try:
+        return json.loads(text)
+    except Exception:
+        pass
 
     try:
-        data = json.loads(raw)
+        data = json.loads(_extract_json(text))
     except Exception:
         # Degrade gracefully
         data = {
@@ -180,3 +270,293 @@ def explain_eligibility_with_gemini(
         }
 
     return data
+
+def explain_eligibility_with_gemini(
+    patient: Dict[str, Any],
+    clinical_note: str,
+    trial: Dict[str, Any],
+    rule_based: ScreenResult,
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.2,
+    client: Optional[genai.Client] = None,
+) -> Dict[str, Any]:
+    """
+    Returns a JSON dict (already parsed) describing the explanation.
+
+    `client` lets callers supply an externally managed client (e.g. one held
+    in a Streamlit resource cache); by default the module-cached one is used.
+    """
+    client = client or _make_client()
+
+    resp = client.models.generate_content(
+        model=model,
+        contents=_single_prompt(patient, clinical_note, trial, rule_based),
+        config=_single_config(temperature),
+    )
+
+    text = getattr(resp, "text", None) or str(resp)
+    return _parse_single_response(text, rule_based)
+
+def _parse_partial_json(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Best-effort parse of a streamed JSON prefix.
+
+    Closes any open string and unbalanced containers so the prefix becomes
+    valid JSON; returns None while the prefix is still unparseable (e.g. it
+    ends mid-key). Used to render partial explanations during streaming.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    closers: List[str] = []
+    in_string = False
+    escape = False
+    for ch in text[start:]:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            closers.append("}")
+        elif ch == "[":
+            closers.append("]")
+        elif ch in "}]" and closers:
+            closers.pop()
+    candidate = text[start:]
+    if in_string:
+        candidate += '"'
+    candidate = candidate.rstrip()
+    if candidate.endswith(","):
+        candidate = candidate[:-1]
+    candidate += "".join(reversed(closers))
+    try:
+        data = json.loads(candidate)
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+def explain_eligibility_stream(
+    patient: Dict[str, Any],
+    clinical_note: str,
+    trial: Dict[str, Any],
+    rule_based: ScreenResult,
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.2,
+    client: Optional[genai.Client] = None,
+):
+    """
+    Streaming variant: yields progressively larger partial explanation dicts
+    as chunks arrive, then the fully parsed result as the last item.
+
+    Total generation time is unchanged, but a UI can show `summary` and the
+    criteria lists as soon as the model emits them instead of blocking on
+    the complete response.
+    """
+    client = client or _make_client()
+
+    pieces: List[str] = []
+    for chunk in client.models.generate_content_stream(
+        model=model,
+        contents=_single_prompt(patient, clinical_note, trial, rule_based),
+        config=_single_config(temperature),
+    ):
+        piece = getattr(chunk, "text", None)
+        if not piece:
+            continue
+        pieces.append(piece)
+        partial = _parse_partial_json("".join(pieces))
+        if partial is not None:
+            yield partial
+
+    yield _parse_single_response("".join(pieces), rule_based)
+
+def _local_explanation(rule_based: ScreenResult) -> Dict[str, Any]:
+    """Schema-shaped restatement of the rule result, built without the LLM."""
+    summary = f"Rule-based screening returned '{rule_based.status}'."
+    if rule_based.reasons:
+        summary += " " + " ".join(rule_based.reasons)
+    return {
+        "final_status": rule_based.status,
+        "summary": summary,
+        "criteria_matched": list(rule_based.criteria_passed),
+        "criteria_violated": list(rule_based.criteria_failed),
+        "missing_information": list(rule_based.missing_fields),
+        "recommended_next_questions": [],
+        "consistency_check_with_rule_based": {
+            "rule_based_status": rule_based.status,
+            "llm_agrees": True,
+            "notes": "Deterministic restatement of the rule-based result; no LLM call made.",
+        },
+        "safety_note": "This is a demo; decisions must be validated clinically.",
+        "_local_only": True,
+    }
+
+def explain_eligibility(
+    patient: Dict[str, Any],
+    clinical_note: str,
+    trial: Dict[str, Any],
+    rule_based: ScreenResult,
+    *,
+    force_llm: bool = False,
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.2,
+    client: Optional[genai.Client] = None,
+) -> Dict[str, Any]:
+    """
+    Preferred entry point: only consult Gemini when it can add information.
+
+    For a decisive "Eligible"/"Not eligible" result the system instructions
+    reduce the model's job to restating the rule engine's output, so that
+    response is templated locally — no tokens, no network round-trip.
+    "Uncertain" results, and callers passing force_llm=True for a fuller
+    narrative, still go to the model.
+    """
+    if not force_llm and rule_based.status != "Uncertain":
+        return _local_explanation(rule_based)
+    return explain_eligibility_with_gemini(
+        patient, clinical_note, trial, rule_based,
+        model=model, temperature=temperature, client=client,
+    )
+
+async def explain_eligibility_with_gemini_async(
+    patient: Dict[str, Any],
+    clinical_note: str,
+    trial: Dict[str, Any],
+    rule_based: ScreenResult,
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.2,
+    client: Optional[genai.Client] = None,
+) -> Dict[str, Any]:
+    """
+    Async twin of `explain_eligibility_with_gemini`, using the SDK's
+    `client.aio` interface. Same prompt, config, and graceful parsing.
+    """
+    client = client or _make_client()
+
+    resp = await client.aio.models.generate_content(
+        model=model,
+        contents=_single_prompt(patient, clinical_note, trial, rule_based),
+        config=_single_config(temperature),
+    )
+
+    text = getattr(resp, "text", None) or str(resp)
+    return _parse_single_response(text, rule_based)
+
+async def explain_many(
+    patient: Dict[str, Any],
+    clinical_note: str,
+    trials: List[Dict[str, Any]],
+    rule_based_results: List[ScreenResult],
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.2,
+    max_concurrency: int = 8,
+    client: Optional[genai.Client] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Explain one patient's eligibility for several trials concurrently.
+
+    The calls are network-bound, so running them serially costs the sum of
+    per-call latencies; overlapping them costs roughly the slowest call. A
+    semaphore bounds in-flight requests to stay under API rate limits.
+
+    Returns one explanation dict per trial, in input order.
+    """
+    if len(trials) != len(rule_based_results):
+        raise ValueError("trials and rule_based_results must have the same length")
+
+    sem = asyncio.Semaphore(max_concurrency)
+
+    async def one(trial, rb):
+        async with sem:
+            return await explain_eligibility_with_gemini_async(
+                patient, clinical_note, trial, rb,
+                model=model, temperature=temperature, client=client,
+            )
+
+    return list(await asyncio.gather(*[one(t, rb) for t, rb in zip(trials, rule_based_results)]))
+
+def explain_eligibility_batch(
+    patient: Dict[str, Any],
+    clinical_note: str,
+    trials: List[Dict[str, Any]],
+    rule_based_results: List[ScreenResult],
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.2,
+    max_per_batch: Optional[int] = None,
+    client: Optional[genai.Client] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Explain one patient's eligibility for several trials, packing up to
+    `max_per_batch` trials into each Gemini call.
+
+    One round-trip per (patient, trial) pair is latency-dominated when
+    screening against the whole catalog; batching amortizes the network and
+    time-to-first-token cost across trials. Larger batches can dilute
+    per-trial answer quality, so the default (GEMINI_MAX_PER_BATCH, 1) keeps
+    one trial per call; any chunk whose response fails to parse as a matching
+    array falls back to individual calls for that chunk only.
+
+    Returns one explanation dict per trial, in input order.
+    """
+    if len(trials) != len(rule_based_results):
+        raise ValueError("trials and rule_based_results must have the same length")
+    if max_per_batch is None:
+        max_per_batch = DEFAULT_MAX_PER_BATCH
+
+    def fallback(chunk_trials, chunk_results):
+        return [
+            explain_eligibility_with_gemini(
+                patient, clinical_note, t, rb,
+                model=model, temperature=temperature, client=client,
+            )
+            for t, rb in zip(chunk_trials, chunk_results)
+        ]
+
+    if max_per_batch <= 1:
+        return fallback(trials, rule_based_results)
+
+    client = client or _make_client()
+    config = types.GenerateContentConfig(
+        temperature=temperature,
+        response_mime_type="application/json",
+        response_schema=BATCH_SCHEMA_HINT,
+    )
+
+    results: List[Dict[str, Any]] = []
+    for start in range(0, len(trials), max_per_batch):
+        chunk_trials = trials[start:start + max_per_batch]
+        chunk_results = rule_based_results[start:start + max_per_batch]
+
+        payload = {
+            "patient_structured": patient,
+            "patient_note_unstructured": clinical_note,
+            "trials": [
+                {"trial": t, "rule_based_result": _rb_summary(rb)}
+                for t, rb in zip(chunk_trials, chunk_results)
+            ],
+        }
+        prompt = (
+            SYSTEM_INSTRUCTIONS
+            + "\n\nINPUT:\n"
+            + _compact_json(payload)
+            + "\n\nOUTPUT: Return ONLY a JSON array with exactly one explanation "
+            + "object per entry of \"trials\", in the same order."
+        )
+
+        try:
+            resp = client.models.generate_content(model=model, contents=prompt, config=config)
+            text = getattr(resp, "text", None) or str(resp)
+            data = json.loads(text)
+            if not isinstance(data, list) or len(data) != len(chunk_trials):
+                raise ValueError("batch response is not a matching array")
+            results.extend(data)
+        except Exception:
+            # Degrade gracefully: re-screen this chunk one trial at a time.
+            results.extend(fallback(chunk_trials, chunk_results))
+
+    return results
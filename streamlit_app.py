@@ -1,6 +1,9 @@
 """Streamlit entrypoint for Streamlit Community Cloud.
 
 This file exists so Streamlit Cloud can run the app without custom path.
+It must stay a bare re-export: `app/streamlit_app.py` is the single source
+of truth for the UI — do not copy app code here, or fixes will land in one
+copy and not the other.
 
 Run locally:
     streamlit run streamlit_app.py